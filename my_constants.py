@@ -0,0 +1,21 @@
+"""
+Constants shared by the game and the tools checking its levels.
+
+Kept free of arcade, so tools like my_solver.py can import them without
+loading the game.
+"""
+
+# Set the scaling of all sprites in the game
+SPRITE_SCALING = 2
+
+TILE_SIZE = 16 * SPRITE_SCALING
+MAP_WIDTH = 15
+MAP_HEIGHT = 18
+
+MAP_FILE = "images/tiny-battle/sampleMap.tmx"
+
+# Set the size of the screen
+SCREEN_WIDTH = MAP_WIDTH * TILE_SIZE
+SCREEN_HEIGHT = MAP_HEIGHT * TILE_SIZE
+
+LEVEL_TIME = 60
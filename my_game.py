@@ -6,31 +6,34 @@ This program uses the Arcade library found at http://arcade.academy
 Artwork from https://kenney.nl/assets/space-shooter-redux
 
 """
+import argparse
+import functools
 import random
+import time
 
 import arcade
 
 # Import sprites from local file my_sprites.py
 from my_sprites import Player, PlayerShot
-
-# Set the scaling of all sprites in the game
-SPRITE_SCALING = 2
-
-TILE_SIZE = 16 * SPRITE_SCALING
-MAP_WIDTH = 15
-MAP_HEIGHT = 18
-
-# Set the size of the screen
-SCREEN_WIDTH = MAP_WIDTH * TILE_SIZE
-SCREEN_HEIGHT = MAP_HEIGHT * TILE_SIZE
+# Constants shared with my_solver.py
+from my_constants import (
+    LEVEL_TIME,
+    MAP_FILE,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    SPRITE_SCALING,
+    TILE_SIZE,
+)
+from my_memory import MemoryTracker
+from my_reload import MapReloader
+from my_telemetry import LEVELS, OFF, Telemetry
+from my_tmx import MapError
 
 # Variables controlling the player
 PLAYER_START_X = SCREEN_WIDTH / 2
 PLAYER_START_Y = 50
 PLAYER_SHOT_SPEED = 300
 
-LEVEL_TIME = 60
-
 FIRE_KEY = arcade.key.SPACE
 
 # Has to be between 0.1 and 0.9
@@ -39,6 +42,44 @@ TIME_BAR_HEIGHT = 20
 TIME_BAR_X = (SCREEN_WIDTH - TIME_BAR_WIDTH) // 2
 TIME_BAR_Y = 35
 
+# Seconds between the actions taken by the soak test
+SOAK_CYCLE_TIME = 0.5
+
+# Seconds between checks for changes in the map files when hot reloading
+MAP_RELOAD_INTERVAL = 0.05
+
+# Set in main() when the map is reloaded on changes
+hot_reload = False
+
+# Set in main() when memory is tracked
+memory_tracker = None
+
+# Replaced in main() when telemetry is turned on
+telemetry = Telemetry(level=OFF)
+
+
+def track_memory(label):
+    """
+    Take a memory snapshot, if memory is being tracked
+    """
+    if memory_tracker:
+        memory_tracker.snapshot(label)
+
+
+@functools.lru_cache(maxsize=None)
+def load_tilemap_textures(file_name):
+    """
+    Load the textures in the tile map. Cached, so it is only loaded once per game.
+    """
+    return arcade.load_spritesheet(
+        file_name=file_name,
+        sprite_width=16,
+        sprite_height=16,
+        columns=18,
+        count=11 * 18,
+        margin=1
+    )
+
 
 class GameView(arcade.View):
     """
@@ -47,7 +88,7 @@ class GameView(arcade.View):
 
     def load_map(self):
         m = arcade.tilemap.TileMap(
-            map_file = "images/tiny-battle/sampleMap.tmx",
+            map_file = MAP_FILE,
             scaling=SPRITE_SCALING,
         )
 
@@ -58,18 +99,45 @@ class GameView(arcade.View):
         Add goal posts on the spots that the tile map specifies
         """
         for layer_tile in self.map.sprite_lists["goal"]:
-            # /4 tile offset considering neither tile nor goal sprite has position in the center
-            new_goal_sprite = arcade.Sprite(
-                texture=self.load_tilemap_textures[100],
-                scale=SPRITE_SCALING, 
-                center_x = layer_tile.center_x,
-                center_y = layer_tile.center_y,
-            )
+            self.add_goal(layer_tile.position)
+
+    def add_goal(self, position):
+        """
+        Add a goal post at position
+        """
+        # /4 tile offset considering neither tile nor goal sprite has position in the center
+        new_goal_sprite = arcade.Sprite(
+            texture=self.load_tilemap_textures[100],
+            scale=SPRITE_SCALING, 
+            center_x = position[0],
+            center_y = position[1],
+        )
+        self.pe.add_sprite(
+            sprite=new_goal_sprite,
+            collision_type="goal",
+        )
+        self.goal_sprite_list.append(new_goal_sprite)
+
+    def add_moving_object(self, object):
+        """
+        Let the physics engine move an object (car) from the map
+        """
+        # Add cars to physics engine once. The engine ignores sprites it already has, but warns about them
+        if object not in self.pe.sprites:
             self.pe.add_sprite(
-                sprite=new_goal_sprite,
-                collision_type="goal",
+                sprite=object,
+                # Body type cannot be kinematic if we want handler to work
+                # body_type=arcade.PymunkPhysicsEngine.KINEMATIC,
+                collision_type="object",
+                )
+
+        self.pe.set_velocity(
+            sprite=object,
+            velocity=(
+                object.properties.get("x-speed", 0),
+                object.properties.get("y-speed", 0),
             )
-            self.goal_sprite_list.append(new_goal_sprite)
+        )
 
     def get_tiles_from_screen_coordinate(self, screen_x, screen_y):
         """
@@ -115,23 +183,13 @@ class GameView(arcade.View):
 
         # Add cars (moving objects)
         for object in self.map.sprite_lists["moving-objects"]:
-            # Add cars to physics engine. We may not want this
-            self.pe.add_sprite(
-                sprite=object,
-                # Body type cannot be kinematic if we want handler to work
-                # body_type=arcade.PymunkPhysicsEngine.KINEMATIC,
-                collision_type="object",
-                )
-            
-            self.pe.set_velocity(
-                sprite=object,
-                velocity=(
-                    object.properties.get("x-speed", 0),
-                    object.properties.get("y-speed", 0),
-                )
-            )
+            self.add_moving_object(object)
 
         if reset_goals:
+            # Remove goals left from the last level, including their physics bodies
+            for goal in list(self.goal_sprite_list):
+                goal.kill()
+
             # Add goals
             self.goal_sprite_list = arcade.SpriteList(use_spatial_hash=False)
             self.add_goals()
@@ -139,13 +197,17 @@ class GameView(arcade.View):
         # Reset timer
         self.timer = LEVEL_TIME
 
+        # Take memory snapshot after the next physics step
+        self.memory_snapshot_pending = True
+
     def next_level(self):
         self.reset(reset_goals=True)
-        print("You reached the next level!!! :)")
+        telemetry.info("level_start", goals=len(self.goal_sprite_list), score=self.player_score)
 
 
-    def on_player_death(self, p):
+    def on_player_death(self, p, cause):
         p.lives -= 1
+        telemetry.info("death", cause=cause, lives=p.lives, position=p.position)
 
 
     def handler_player_object(self, player, object, _arbiter, _space, _data):
@@ -157,7 +219,7 @@ class GameView(arcade.View):
                 player.rides_on = object
                 
             else:
-                self.on_player_death(self.player)
+                self.on_player_death(self.player, "object")
                 self.reset()
 
         # Physics engine shouldn't do anything when this collision happens
@@ -167,8 +229,8 @@ class GameView(arcade.View):
 
     def handler_player_goal(self, player, goal, _arbiter, _space, _data):
         # remove the goal and return player to start
-        print(f"Goal Collected! Only {len(self.goal_sprite_list)} left!")
         goal.kill()
+        telemetry.info("goal_collected", goals_left=len(self.goal_sprite_list), position=goal.position)
         self.reset()
         return False
 
@@ -268,14 +330,10 @@ class GameView(arcade.View):
 
         self.texture_pack_name = "images/tiny-battle/tilemap.png"
 
-        self.load_tilemap_textures = arcade.load_spritesheet(
-            file_name=self.texture_pack_name,
-            sprite_width=16,
-            sprite_height=16,
-            columns=18,
-            count=11 * 18,
-            margin=1
-        )
+        self.load_tilemap_textures = load_tilemap_textures(self.texture_pack_name)
+
+        # No goals before the first level
+        self.goal_sprite_list = arcade.SpriteList(use_spatial_hash=False)
 
         # Create a Player object
         self.player = Player(
@@ -310,7 +368,7 @@ class GameView(arcade.View):
         joysticks = arcade.get_joysticks()
 
         if joysticks:
-            print("Found {} joystick(s)".format(len(joysticks)))
+            telemetry.info("joysticks", count=len(joysticks))
 
             # Use 1st joystick found
             self.joystick = joysticks[0]
@@ -325,7 +383,7 @@ class GameView(arcade.View):
             self.joystick.on_joyhat_motion = self.on_joyhat_motion
 
         else:
-            print("No joysticks found")
+            telemetry.info("joysticks", count=0)
             self.joystick = None
 
         # Set the background color
@@ -334,6 +392,40 @@ class GameView(arcade.View):
         # Set player position, cars and timer
         self.next_level()
 
+        # Apply changes in the map files while the game runs
+        if hot_reload:
+            self.map_reloader = MapReloader(self, MAP_FILE, SPRITE_SCALING)
+            arcade.schedule(self.check_map_changes, MAP_RELOAD_INTERVAL)
+
+        track_memory("show GameView")
+
+    def check_map_changes(self, delta_time):
+        """
+        Reload the parts of the map that changed
+        """
+        try:
+            changes = self.map_reloader.reload_if_changed()
+        except MapError as e:
+            # Keep playing the loaded map. The error is reported once for each save.
+            print(f"Map not reloaded: {e}")
+            telemetry.info("map_reload_failed", error=str(e))
+            return
+
+        if changes:
+            telemetry.info("map_reloaded", **changes)
+
+    def on_hide_view(self):
+        """
+        This is run once when we switch away from this view
+        """
+        if hot_reload:
+            arcade.unschedule(self.check_map_changes)
+
+        # The joystick keeps a reference to this view through the handlers
+        if self.joystick:
+            self.joystick.close()
+            self.joystick = None
+
     def on_draw(self):
         """
         Render the screen.
@@ -373,6 +465,12 @@ class GameView(arcade.View):
         # Physics engine takes a step
         self.pe.step()
 
+        # Pymunk releases the shapes removed from the space in the step,
+        # so the snapshot after a reset is taken here
+        if self.memory_snapshot_pending:
+            track_memory("reset")
+            self.memory_snapshot_pending = False
+
         # Player riding something
         if self.player.rides_on != None:
             self.pe.set_position(
@@ -419,7 +517,7 @@ class GameView(arcade.View):
         if self.player.rides_on == None:
             for deadly_tile in self.map.sprite_lists["deadly"]:
                 if deadly_tile.collides_with_point(self.player.position):
-                    self.on_player_death(self.player)
+                    self.on_player_death(self.player, "deadly-tile")
                     self.reset()
 
         # Update the timer
@@ -431,13 +529,14 @@ class GameView(arcade.View):
 
         # checks if player is outside of screen
         if not (0 < self.player.center_x < SCREEN_WIDTH) or not (0 < self.player.center_y < SCREEN_HEIGHT):
-            self.on_player_death(self.player)
+            self.on_player_death(self.player, "off-screen")
             self.reset()
 
     def game_over(self):
         """
         Call this when the game is over
         """
+        telemetry.info("game_over", score=self.player_score, lives=self.player.lives, time_left=self.timer)
 
         # Create a game over view
         game_over_view = GameOverView(score=self.player_score)
@@ -449,6 +548,7 @@ class GameView(arcade.View):
         """
         Called whenever a key is pressed.
         """
+        telemetry.debug("key_press", key=key)
 
         # The new player position
         new_pp = self.player.position
@@ -498,18 +598,18 @@ class GameView(arcade.View):
             self.right_pressed = False
 
     def on_joybutton_press(self, joystick, button_no):
-        print("Button pressed:", button_no)
+        telemetry.debug("joybutton_press", button=button_no)
         # Press the fire key
         self.on_key_press(FIRE_KEY, [])
 
     def on_joybutton_release(self, joystick, button_no):
-        print("Button released:", button_no)
+        telemetry.debug("joybutton_release", button=button_no)
 
     def on_joyaxis_motion(self, joystick, axis, value):
-        print("Joystick axis {}, value {}".format(axis, value))
+        telemetry.debug("joyaxis_motion", axis=axis, value=value)
 
     def on_joyhat_motion(self, joystick, hat_x, hat_y):
-        print("Joystick hat ({}, {})".format(hat_x, hat_y))
+        telemetry.debug("joyhat_motion", hat_x=hat_x, hat_y=hat_y)
 
 
 class IntroView(arcade.View):
@@ -529,6 +629,8 @@ class IntroView(arcade.View):
         # to reset the viewport back to the start so we can see what we draw.
         arcade.set_viewport(0, self.window.width, 0, self.window.height)
 
+        track_memory("show IntroView")
+
     def on_draw(self):
         """
         Draw this view
@@ -594,6 +696,8 @@ class GameOverView(arcade.View):
         # to reset the viewport back to the start so we can see what we draw.
         arcade.set_viewport(0, self.window.width, 0, self.window.height)
 
+        track_memory("show GameOverView")
+
     def on_draw(self):
         """
         Draw this view
@@ -629,10 +733,83 @@ class GameOverView(arcade.View):
         self.window.show_view(intro_view)
 
 
+def soak_test(window, hours):
+    """
+    Cycle through levels, deaths and game overs for hours,
+    so that memory growth can be spotted
+    """
+    end_time = time.monotonic() + hours * 3600
+
+    def soak_step(delta_time):
+        if time.monotonic() > end_time:
+            arcade.unschedule(soak_step)
+            arcade.exit()
+            return
+
+        view = window.current_view
+
+        if not isinstance(view, GameView):
+            # Press a key like a player: game over goes to the intro, the intro starts a game
+            view.on_key_press(arcade.key.SPACE, 0)
+            return
+
+        action = random.choice(["death", "goal", "next_level", "game_over"])
+
+        if action == "death":
+            view.on_player_death(view.player, "soak")
+            view.reset()
+        elif action == "goal" and view.goal_sprite_list:
+            view.handler_player_goal(view.player, view.goal_sprite_list[0], None, None, None)
+        elif action == "next_level":
+            view.next_level()
+        elif action == "game_over":
+            view.game_over()
+
+    arcade.schedule(soak_step, SOAK_CYCLE_TIME)
+
+
 def main():
     """
     Main method
     """
+    global memory_tracker, telemetry, hot_reload
+
+    parser = argparse.ArgumentParser(description="Frogger")
+    parser.add_argument(
+        "--track-memory",
+        action="store_true",
+        help="take memory snapshots on every reset and view switch",
+    )
+    parser.add_argument(
+        "--soak",
+        type=float,
+        metavar="HOURS",
+        help="cycle levels for HOURS and report memory growth (implies --track-memory)",
+    )
+    parser.add_argument(
+        "--hot-reload",
+        action="store_true",
+        help="apply changes in the map files while the game is running",
+    )
+    parser.add_argument(
+        "--telemetry",
+        choices=LEVELS,
+        default="off",
+        help="log game events at this level",
+    )
+    parser.add_argument(
+        "--telemetry-file",
+        default="telemetry.jsonl",
+        help="JSON lines file to log game events to",
+    )
+    args = parser.parse_args()
+
+    telemetry = Telemetry(args.telemetry_file, LEVELS[args.telemetry])
+    hot_reload = args.hot_reload
+
+    if args.track_memory or args.soak:
+        memory_tracker = MemoryTracker()
+
     # Create a window to hold views
     window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT)
 
@@ -641,7 +818,17 @@ def main():
 
     window.show_view(start_view)
 
-    arcade.run()
+    if args.soak:
+        soak_test(window, args.soak)
+
+    # Report and write the last events also when the game crashes
+    try:
+        arcade.run()
+    finally:
+        if memory_tracker:
+            memory_tracker.report()
+
+        telemetry.close()
 
 
 if __name__ == "__main__":
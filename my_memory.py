@@ -0,0 +1,179 @@
+"""
+Memory instrumentation for hunting leaks in long running games.
+
+A MemoryTracker takes snapshots of the Python allocations (using tracemalloc)
+and counts the live sprites, textures, Pymunk bodies and views. Snapshots are
+grouped by a label (e.g. "reset" or "show GameView"), so that snapshots taken
+at the same point in the game can be compared against each other.
+"""
+import gc
+import time
+import tracemalloc
+
+import arcade
+import pymunk
+
+
+# The kinds of objects to count in every snapshot
+TRACKED_TYPES = {
+    "sprites": arcade.Sprite,
+    "textures": arcade.Texture,
+    "bodies": pymunk.Body,
+    "views": arcade.View,
+}
+
+
+# The tracked name for each type seen while counting, None if not tracked
+tracked_names = {}
+
+
+def tracked_name(object_type):
+    """
+    The name in TRACKED_TYPES of a type or its base class. None if not tracked.
+    """
+    for name, tracked_type in TRACKED_TYPES.items():
+        if issubclass(object_type, tracked_type):
+            return name
+
+    return None
+
+
+def count_live_objects():
+    """
+    Count the live objects of the tracked types
+    """
+    counts = dict.fromkeys(TRACKED_TYPES, 0)
+
+    # Most objects are of a few types, so only look up the name once per type
+    for object_type in map(type, gc.get_objects()):
+        if object_type not in tracked_names:
+            tracked_names[object_type] = tracked_name(object_type)
+
+        name = tracked_names[object_type]
+        if name:
+            counts[name] += 1
+
+    return counts
+
+
+class MemoryTracker:
+    """
+    Takes snapshots of memory use and flags growth between them
+    """
+
+    def __init__(self, warmup=3, growth_limit=0.2, frames=10):
+        """
+        Create a MemoryTracker. The highest values in the first warmup snapshots
+        of a label are used as the baseline for that label. A snapshot is flagged when the traced memory
+        grows by more than growth_limit (fraction) compared to the baseline, or when
+        any of the object counts is higher than in the baseline.
+        """
+        self.warmup = warmup
+        self.growth_limit = growth_limit
+
+        # Number of snapshots taken for each label. Snapshots are not kept, since
+        # keeping them would make memory grow during long runs
+        self.label_counts = {}
+
+        # Baseline for each label, raised when growth is flagged
+        self.baselines = {}
+
+        # First baseline and most recent snapshot for each label
+        self.first_baselines = {}
+        self.last_snapshots = {}
+
+        # The tracemalloc snapshot taken when the baseline was settled
+        self.baseline_traces = {}
+
+        # Number of snapshots flagged as growth
+        self.flagged = 0
+
+        self.start_time = time.monotonic()
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def snapshot(self, label):
+        """
+        Take a snapshot and compare it with the baseline for the label.
+        Returns the snapshot.
+        """
+        # Collect reference cycles, so that we only count objects still in use
+        gc.collect()
+
+        traced, peak = tracemalloc.get_traced_memory()
+
+        s = {
+            "label": label,
+            "time": time.monotonic() - self.start_time,
+            "traced": traced,
+            "peak": peak,
+        }
+        s.update(count_live_objects())
+
+        label_count = self.label_counts.get(label, 0) + 1
+        self.label_counts[label] = label_count
+        self.last_snapshots[label] = s
+
+        if label_count <= self.warmup:
+            # Counts go up and down during a game (e.g. goals), so use the highest values
+            baseline = self.baselines.get(label, s)
+            self.baselines[label] = {
+                name: max(value, s[name]) if name != "label" else value
+                for name, value in baseline.items()
+            }
+
+            if label_count == self.warmup:
+                self.first_baselines[label] = self.baselines[label]
+                self.baseline_traces[label] = tracemalloc.take_snapshot()
+        else:
+            self.check_growth(s)
+
+        return s
+
+    def check_growth(self, s):
+        """
+        Report if snapshot has grown compared to the baseline of its label
+        """
+        baseline = self.baselines[s["label"]]
+
+        grown = [
+            name for name in TRACKED_TYPES if s[name] > baseline[name]
+        ]
+
+        if s["traced"] > baseline["traced"] * (1 + self.growth_limit):
+            grown.append("traced")
+
+        if not grown:
+            return
+
+        self.flagged += 1
+
+        print(
+            f"Possible leak at '{s['label']}' after {s['time']:.0f}s: " +
+            ", ".join(f"{name} {baseline[name]} -> {s[name]}" for name in grown)
+        )
+
+        # Show where the new allocations come from
+        stats = tracemalloc.take_snapshot().compare_to(
+            self.baseline_traces[s["label"]],
+            "lineno",
+        )
+        for stat in stats[:5]:
+            print(f"  {stat}")
+
+        # Compare with the new level from now on, so we only report further growth
+        self.baselines[s["label"]] = s
+
+    def report(self):
+        """
+        Print a summary of the snapshots taken
+        """
+        print(f"Memory snapshots: {sum(self.label_counts.values())}, flagged: {self.flagged}")
+
+        for label, baseline in self.first_baselines.items():
+            last = self.last_snapshots[label]
+            print(
+                f"  {label}: traced {baseline['traced']} -> {last['traced']} bytes, " +
+                ", ".join(f"{name} {baseline[name]} -> {last[name]}" for name in TRACKED_TYPES)
+            )
@@ -0,0 +1,335 @@
+"""
+Hot reload of the map while the game is running.
+
+MapReloader watches the TMX file and the TSX files of its tilesets. When they
+change, the new map is compared with the loaded one, and only the tiles and
+moving objects that changed are replaced in the sprite lists and the physics
+engine. Textures are created the way arcade.tilemap.TileMap creates them, so
+they come from arcade's texture cache and the tileset image is not loaded again.
+
+When a tileset changes, its tiles may have new properties, hit boxes or
+animations. The sprites that are replaced are then taken from an
+arcade.tilemap.TileMap of the new map, so they are the same as when the game
+starts.
+
+A map that cannot be read raises MapError, and the loaded map is kept. The
+files are not read again until they change.
+"""
+import os
+import time
+
+import arcade
+
+from my_tmx import (
+    FLIPPED_DIAGONALLY_FLAG,
+    FLIPPED_HORIZONTALLY_FLAG,
+    FLIPPED_VERTICALLY_FLAG,
+    GID_MASK,
+    MapError,
+    TiledMap,
+)
+
+
+class MapReloader:
+    """
+    Applies changes in the map files to a running GameView
+    """
+
+    def __init__(self, view, file_name, scaling):
+        """
+        Create a MapReloader for the map the view has loaded from file_name
+        """
+        self.view = view
+        self.file_name = file_name
+        self.scaling = scaling
+
+        self.tmx = TiledMap(file_name)
+        self.mtimes = self.file_mtimes(self.watched_files(self.tmx))
+
+        self.tile_size = self.tmx.tile_width * scaling
+
+        # Tile sprites in each layer by (column, row), row 0 at the bottom
+        self.tiles = {
+            name: {
+                self.tile_at(sprite.position): sprite
+                for sprite in view.map.sprite_lists.get(name, [])
+            }
+            for name in self.tmx.layers
+        }
+
+        # Moving object sprites by object id. arcade adds the objects in the order of the file.
+        self.objects = dict(zip(
+            [o.id for o in self.tmx.object_layers.get("moving-objects", []) if o.gid],
+            view.map.sprite_lists.get("moving-objects", []),
+        ))
+
+    def tile_at(self, position):
+        return (int(position[0] // self.tile_size), int(position[1] // self.tile_size))
+
+    def watched_files(self, tmx_map):
+        """
+        The map file and the TSX files it uses
+        """
+        return [self.file_name] + [t.file_name for t in tmx_map.tilesets if t.file_name]
+
+    def file_mtimes(self, files):
+        """
+        Modification times of files
+        """
+        mtimes = {}
+        for f in files:
+            try:
+                mtimes[f] = os.stat(f).st_mtime_ns
+            except OSError:
+                mtimes[f] = None
+
+        return mtimes
+
+    def reload_if_changed(self):
+        """
+        Apply the changes, if the map files have changed since the last check.
+        Returns the number of changed tiles and objects and the time it took, or None
+        if nothing was changed. Raises MapError if the changed map cannot be read.
+        """
+        mtimes = self.file_mtimes(self.mtimes)
+        if mtimes == self.mtimes:
+            return None
+
+        # Taken before reading, so a save during the reload is applied on the next
+        # check. A map that cannot be read is not read again until it is saved again.
+        self.mtimes = mtimes
+
+        start_time = time.perf_counter()
+
+        new_tmx = TiledMap(self.file_name)
+
+        for tileset in new_tmx.tilesets:
+            if not os.path.isfile(tileset.image):
+                raise MapError(f"Tileset image {tileset.image} not found")
+
+        # Tilesets that are not in the loaded map, or have changed
+        old_tilesets = [vars(t) for t in self.tmx.tilesets]
+        changed_tilesets = {
+            t.first_gid for t in new_tmx.tilesets if vars(t) not in old_tilesets
+        }
+
+        arcade_map = None
+        if changed_tilesets:
+            # arcade reads the map with another parser, which may fail on other problems
+            try:
+                arcade_map = arcade.tilemap.TileMap(self.file_name, scaling=self.scaling)
+            except Exception as e:
+                raise MapError(f"arcade cannot load {self.file_name}: {e!r}") from e
+
+        tile_count = self.reload_tiles(new_tmx, changed_tilesets, arcade_map)
+        object_count = self.reload_objects(new_tmx, changed_tilesets, arcade_map)
+
+        self.tmx = new_tmx
+
+        # TSX files added to the map are watched from now on
+        self.mtimes = {
+            f: mtimes[f] if f in mtimes else self.file_mtimes([f])[f]
+            for f in self.watched_files(new_tmx)
+        }
+
+        return {
+            "tiles": tile_count,
+            "objects": object_count,
+            "ms": round((time.perf_counter() - start_time) * 1000, 1),
+        }
+
+    def uses_tilesets(self, tmx_map, gid, tilesets):
+        """
+        True if the tile with gid is in one of tilesets (first gids)
+        """
+        tileset = tmx_map.tileset_for(gid) if gid & GID_MASK else None
+
+        return tileset is not None and tileset.first_gid in tilesets
+
+    def take_sprite(self, sprite):
+        """
+        Take a sprite out of the arcade map, so it can be added to the game
+        """
+        if sprite:
+            sprite.remove_from_sprite_lists()
+
+        return sprite
+
+    def reload_tiles(self, new_tmx, changed_tilesets, arcade_map):
+        """
+        Replace the tiles that changed in the tile layers. Returns the number of tiles changed.
+        New sprites are taken from arcade_map if it is not None.
+        """
+        count = 0
+
+        for name in self.tmx.layers.keys() | new_tmx.layers.keys():
+            old_rows = self.tmx.layers.get(name, [])
+            new_rows = new_tmx.layers.get(name, [])
+
+            sprite_list = self.view.map.sprite_lists.get(name)
+            if sprite_list is None:
+                sprite_list = arcade.SpriteList()
+                self.view.map.sprite_lists[name] = sprite_list
+
+            sprites = self.tiles.setdefault(name, {})
+
+            arcade_sprites = {}
+            if arcade_map:
+                arcade_sprites = {
+                    self.tile_at(sprite.position): sprite
+                    for sprite in arcade_map.sprite_lists.get(name, [])
+                }
+
+            for row in range(max(len(old_rows), len(new_rows))):
+                old_gids = old_rows[row] if row < len(old_rows) else []
+                new_gids = new_rows[row] if row < len(new_rows) else []
+
+                if old_gids == new_gids and not changed_tilesets:
+                    continue
+
+                for column in range(max(len(old_gids), len(new_gids))):
+                    old_gid = old_gids[column] if column < len(old_gids) else 0
+                    new_gid = new_gids[column] if column < len(new_gids) else 0
+
+                    if not (old_gid or new_gid):
+                        continue
+
+                    if old_gid == new_gid and not self.uses_tilesets(new_tmx, new_gid, changed_tilesets):
+                        continue
+
+                    tile = (column, new_tmx.height - 1 - row)
+
+                    if arcade_map:
+                        new_sprite = self.take_sprite(arcade_sprites.get(tile))
+                    else:
+                        new_sprite = self.create_sprite(new_tmx, new_gid)
+
+                    self.replace_tile(name, sprite_list, sprites, tile, new_sprite)
+                    count += 1
+
+        return count
+
+    def replace_tile(self, layer_name, sprite_list, sprites, tile, new_sprite):
+        """
+        Replace the sprite on a tile with new_sprite. No sprite if new_sprite is None.
+        """
+        position = (
+            (tile[0] + 0.5) * self.tile_size,
+            (tile[1] + 0.5) * self.tile_size,
+        )
+
+        old_sprite = sprites.pop(tile, None)
+        if old_sprite:
+            old_sprite.kill()
+
+        # Goal posts are separate sprites placed on the goal tiles
+        if layer_name == "goal":
+            for goal in list(self.view.goal_sprite_list):
+                if self.tile_at(goal.position) == tile:
+                    goal.kill()
+
+        if new_sprite:
+            new_sprite.position = position
+            sprite_list.append(new_sprite)
+            sprites[tile] = new_sprite
+
+            if layer_name == "goal":
+                self.view.add_goal(position)
+
+    def reload_objects(self, new_tmx, changed_tilesets, arcade_map):
+        """
+        Replace the moving objects that changed. Returns the number of objects changed.
+        New sprites are taken from arcade_map if it is not None.
+        """
+        old_objects = {
+            o.id: o for o in self.tmx.object_layers.get("moving-objects", []) if o.gid
+        }
+        new_objects = {
+            o.id: o for o in new_tmx.object_layers.get("moving-objects", []) if o.gid
+        }
+
+        sprite_list = self.view.map.sprite_lists.get("moving-objects")
+        if sprite_list is None:
+            sprite_list = arcade.SpriteList()
+            self.view.map.sprite_lists["moving-objects"] = sprite_list
+
+        arcade_sprites = {}
+        if arcade_map:
+            # arcade adds the objects in the order of the file
+            arcade_sprites = dict(zip(
+                new_objects,
+                arcade_map.sprite_lists.get("moving-objects", []),
+            ))
+
+        count = 0
+
+        for object_id in old_objects.keys() | new_objects.keys():
+            old_object = old_objects.get(object_id)
+            new_object = new_objects.get(object_id)
+
+            if (
+                old_object and new_object
+                and vars(old_object) == vars(new_object)
+                and not self.uses_tilesets(new_tmx, new_object.gid, changed_tilesets)
+            ):
+                continue
+
+            count += 1
+
+            # Changed objects are replaced, so the physics engine gets a body
+            # matching the new texture
+            old_sprite = self.objects.pop(object_id, None)
+            if old_sprite:
+                if self.view.player.rides_on is old_sprite:
+                    self.view.player.rides_on = None
+                old_sprite.kill()
+
+            if new_object is None:
+                continue
+
+            if arcade_map:
+                new_sprite = self.take_sprite(arcade_sprites.get(object_id))
+            else:
+                new_sprite = self.create_sprite(new_tmx, new_object.gid)
+
+                if new_sprite:
+                    new_sprite.width = new_object.width * self.scaling
+                    new_sprite.height = new_object.height * self.scaling
+                    new_sprite.position = new_object.center(new_tmx, self.scaling)
+                    new_sprite.properties.update(new_object.properties)
+
+            if new_sprite is None:
+                continue
+
+            sprite_list.append(new_sprite)
+            self.view.add_moving_object(new_sprite)
+            self.objects[object_id] = new_sprite
+
+        return count
+
+    def create_sprite(self, tmx_map, gid):
+        """
+        Create a sprite for the tile with gid, like arcade.tilemap.TileMap does.
+        None if gid is 0 or not in a tileset.
+        """
+        tileset = tmx_map.tileset_for(gid) if gid & GID_MASK else None
+        if tileset is None:
+            return None
+
+        image_x, image_y, width, height = tileset.tile_rect(gid)
+
+        sprite = arcade.Sprite(
+            filename=tileset.image,
+            scale=self.scaling,
+            image_x=image_x,
+            image_y=image_y,
+            image_width=width,
+            image_height=height,
+            flipped_horizontally=bool(gid & FLIPPED_HORIZONTALLY_FLAG),
+            flipped_vertically=bool(gid & FLIPPED_VERTICALLY_FLAG),
+            flipped_diagonally=bool(gid & FLIPPED_DIAGONALLY_FLAG),
+            hit_box_algorithm="Simple",
+        )
+        sprite.properties["tile_id"] = (gid & GID_MASK) - tileset.first_gid
+
+        return sprite
@@ -0,0 +1,534 @@
+"""
+Check that levels can be cleared within LEVEL_TIME.
+
+The solver follows the rules in GameView: the player moves one tile per key
+press, dies on deadly tiles and when touching moving objects that are not
+ridable, rides ridable objects, and collects goals by touching them.
+
+The game is searched in physics steps (ticks). Moving objects wrap around the
+screen to a fixed position, so after their first wrap they repeat their
+positions exactly. The solver uses this to recognise states it has already
+seen: a state is the player position plus the phase of the moving objects.
+
+reset() puts the timer back after every goal and death, but leaves the moving
+objects where they are. So the next goal is started from whatever phase the
+objects are in. By default the solver starts from the phase at the start of
+the level (tick 0). With all_phases (--all-phases) it tries every phase and
+reports the slowest, which is exact but takes longer.
+
+Run from the command line to check one or more maps:
+
+    python my_solver.py images/tiny-battle/sampleMap.tmx
+"""
+import argparse
+import math
+import sys
+
+from my_constants import (
+    LEVEL_TIME,
+    MAP_FILE,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    SPRITE_SCALING,
+    TILE_SIZE,
+)
+from my_tmx import TiledMap
+
+
+# pe.step() moves the physics 1/60 s on every update
+TICKS_PER_SECOND = 60
+
+# Ticks between the key presses the solver tries. 6 ticks is 10 key presses per second.
+INPUT_TICKS = 6
+
+# Key presses: any other key, arrow keys. Any other key drops a riding player on the tile below.
+MOVES = [(0, 0), (0, 1), (0, -1), (-1, 0), (1, 0)]
+
+
+class MovingObject:
+    """
+    A moving object from the map, stepped like the physics engine and wrap logic in GameView
+    """
+
+    def __init__(self, tiled_object, tmx_map):
+        self.x, self.y = tiled_object.center(tmx_map, SPRITE_SCALING)
+        self.change_x = tiled_object.properties.get("x-speed", 0) / TICKS_PER_SECOND
+        self.change_y = tiled_object.properties.get("y-speed", 0) / TICKS_PER_SECOND
+        self.ridable = tiled_object.properties.get("ridable", False)
+
+        # Ticks when the object wrapped on each axis
+        self.wraps = {"x": [], "y": []}
+
+    def step(self, tick):
+        """
+        Move the object one tick. Returns the position before wrapping,
+        which is where collisions and riding happen.
+        """
+        self.x += self.change_x
+        self.y += self.change_y
+
+        position = (self.x, self.y)
+
+        if self.x > SCREEN_WIDTH + TILE_SIZE / 2:
+            self.x = 0 - TILE_SIZE / 2
+            self.wraps["x"].append(tick)
+        elif self.x < 0 - TILE_SIZE / 2:
+            self.x = SCREEN_WIDTH + TILE_SIZE / 2
+            self.wraps["x"].append(tick)
+
+        if self.y > SCREEN_HEIGHT + TILE_SIZE / 2:
+            self.y = 0 - TILE_SIZE / 2
+            self.wraps["y"].append(tick)
+        elif self.y < 0 - TILE_SIZE / 2:
+            self.y = SCREEN_HEIGHT + TILE_SIZE / 2
+            self.wraps["y"].append(tick)
+
+        return position
+
+    def cycle(self):
+        """
+        (first tick of the cycle, ticks in the cycle) of the object's positions.
+        None if the object has not wrapped twice on each moving axis yet.
+        """
+        start = 0
+        length = 1
+
+        for axis, change in (("x", self.change_x), ("y", self.change_y)):
+            if change == 0:
+                continue
+
+            wraps = self.wraps[axis]
+            if len(wraps) < 2:
+                return None
+
+            # Positions repeat from the tick after the first wrap
+            start = max(start, wraps[0] + 1)
+            length = math.lcm(length, wraps[1] - wraps[0])
+
+        return start, length
+
+
+class LevelReport:
+    """
+    The result of solving a level
+    """
+
+    def __init__(self, file_name, clear_times):
+        self.file_name = file_name
+
+        # Seconds to reach each goal (column, row) from the slowest start position.
+        # None if the goal cannot be reached within LEVEL_TIME.
+        self.clear_times = clear_times
+
+    @property
+    def solvable(self):
+        return all(t is not None for t in self.clear_times.values())
+
+    def __str__(self):
+        lines = [f"{self.file_name}: {'solvable' if self.solvable else 'NOT SOLVABLE'}"]
+
+        for goal, t in sorted(self.clear_times.items()):
+            lines.append(
+                f"  goal {goal}: " + (f"{t:.2f}s" if t is not None else "not reachable")
+            )
+
+        return "\n".join(lines)
+
+
+class LevelSolver:
+    """
+    Finds the fastest way to each goal in a level
+    """
+
+    def __init__(self, file_name, input_ticks=INPUT_TICKS, all_phases=False):
+        self.file_name = file_name
+        self.input_ticks = input_ticks
+        self.all_phases = all_phases
+        self.max_ticks = LEVEL_TIME * TICKS_PER_SECOND
+
+        tmx_map = TiledMap(file_name)
+
+        self.map_width = tmx_map.width
+        self.map_height = tmx_map.height
+
+        # Tiles are numbered column + row * map width, row 0 at the bottom
+        self.deadly_tiles = {
+            self.tile(c, r) for c, r in tmx_map.tile_positions("deadly")
+        }
+        self.goal_tiles = {
+            self.tile(c, r) for c, r in tmx_map.tile_positions("goal")
+        }
+        self.start_tiles = {
+            self.tile(c, r) for c, r in tmx_map.tile_positions("start-pos")
+        }
+
+        self.objects = [
+            MovingObject(o, tmx_map)
+            for o in tmx_map.object_layers.get("moving-objects", [])
+            if o.gid
+        ]
+
+        self.simulate_objects()
+
+        # Tiles the player can stand on after a key press, not moving included
+        tile_count = self.map_width * self.map_height
+        self.neighbours = [
+            {tile} | {self.press_key(tile, 0, move)[0] for move in MOVES} - {None}
+            for tile in range(tile_count)
+        ]
+
+        # Tiles where something may happen in the ticks after a key press, by phase
+        self.busy_tiles_cache = {}
+
+    def tile(self, column, row):
+        return column + row * self.map_width
+
+    def tile_center(self, tile):
+        return (
+            (tile % self.map_width + 0.5) * TILE_SIZE,
+            (tile // self.map_width + 0.5) * TILE_SIZE,
+        )
+
+    def tile_at(self, x, y):
+        """
+        The tile at a screen position, as snap_to_map_coordinates() does it
+        """
+        column = int(x // TILE_SIZE)
+        row = int(y // TILE_SIZE)
+
+        if 0 <= column < self.map_width and 0 <= row < self.map_height:
+            return self.tile(column, row)
+
+        return None
+
+    def simulate_objects(self):
+        """
+        Step the moving objects until their positions repeat, or LEVEL_TIME has passed.
+        When solving from all phases without a cycle, the search may start as late as
+        LEVEL_TIME, so the objects are stepped twice as long. For every tick, store the
+        object positions, the tiles where a player would die or start riding, and where
+        riding ends.
+        """
+        # Positions of all objects in each tick
+        self.positions = []
+
+        # Tiles where the player touches an object that is not ridable
+        self.object_tiles = []
+
+        # Tiles where the player touches ridable objects, and the objects touched, closest first
+        self.ride_tiles = []
+
+        # Ridable objects where riding ends: the goal touched, or None if off screen
+        self.ride_ends = []
+
+        # Tiles touched by each object in the last tick, with distances
+        self.touched = []
+
+        # Ticks before the cycle starts and ticks in the cycle. No cycle if the
+        # objects do not repeat within LEVEL_TIME.
+        self.cycle_start = None
+        self.cycle_length = None
+
+        self.store_tick([(o.x, o.y) for o in self.objects])
+
+        last_tick = self.max_ticks * 2 if self.all_phases else self.max_ticks
+
+        for tick in range(1, last_tick + 1):
+            self.store_tick([o.step(tick) for o in self.objects])
+
+            cycles = [o.cycle() for o in self.objects]
+            if all(cycles):
+                cycle_start = max([start for start, _ in cycles], default=0)
+                cycle_length = math.lcm(*[length for _, length in cycles])
+
+                # Stop when a whole cycle has been stored
+                if tick >= cycle_start + cycle_length - 1:
+                    self.cycle_start = cycle_start
+                    self.cycle_length = cycle_length
+                    break
+
+    def store_tick(self, positions):
+        """
+        Store the object positions in a tick, and the tiles they touch
+        """
+        object_tiles = set()
+        ride_tiles = {}
+
+        # Objects that did not move touch the same tiles as in the last tick
+        if self.positions:
+            touched = [
+                last if position == last_position else self.touched_tiles(*position)
+                for position, last_position, last in zip(positions, self.positions[-1], self.touched)
+            ]
+            ridables_moved = any(
+                o.ridable and t is not last for o, t, last in zip(self.objects, touched, self.touched)
+            )
+        else:
+            touched = [self.touched_tiles(*position) for position in positions]
+            ridables_moved = True
+        self.touched = touched
+
+        for i, o in enumerate(self.objects):
+            for tile, distance in touched[i]:
+                if not o.ridable:
+                    object_tiles.add(tile)
+                elif ridables_moved:
+                    ride_tiles.setdefault(tile, []).append((distance, i))
+
+        self.positions.append(positions)
+        self.object_tiles.append(object_tiles)
+
+        if ridables_moved:
+            self.ride_tiles.append(
+                {tile: [i for _, i in sorted(objects)] for tile, objects in ride_tiles.items()}
+            )
+            self.ride_ends.append(self.ride_ends_at(positions, touched))
+        else:
+            self.ride_tiles.append(self.ride_tiles[-1])
+            self.ride_ends.append(self.ride_ends[-1])
+
+    def ride_ends_at(self, positions, touched):
+        """
+        Ridable objects where a riding player leaves the screen (None) or touches a goal
+        """
+        ends = {}
+
+        for i, o in enumerate(self.objects):
+            if not o.ridable:
+                continue
+
+            x, y = positions[i]
+            if not (0 < x < SCREEN_WIDTH) or not (0 < y < SCREEN_HEIGHT):
+                ends[i] = None
+                continue
+
+            # A riding player is at the center of the object, so it touches the same tiles
+            goal = next((tile for tile, _ in touched[i] if tile in self.goal_tiles), None)
+            if goal is not None:
+                ends[i] = goal
+
+        return ends
+
+    def phase(self, tick):
+        """
+        Index in the stored ticks with the same object positions as tick
+        """
+        if self.cycle_start is None or tick < self.cycle_start:
+            return tick
+
+        return self.cycle_start + (tick - self.cycle_start) % self.cycle_length
+
+    def touched_tiles(self, x, y):
+        """
+        Tiles where a player standing in the center would touch an object at x, y,
+        and the distance from the center of each tile to the object
+        """
+        columns = [
+            (c, abs((c + 0.5) * TILE_SIZE - x))
+            for c in range(int(x // TILE_SIZE) - 1, int(x // TILE_SIZE) + 2)
+            if 0 <= c < self.map_width
+        ]
+        rows = [
+            (r, abs((r + 0.5) * TILE_SIZE - y))
+            for r in range(int(y // TILE_SIZE) - 1, int(y // TILE_SIZE) + 2)
+            if 0 <= r < self.map_height
+        ]
+
+        return [
+            (self.tile(c, r), dx + dy)
+            for c, dx in columns if dx < TILE_SIZE
+            for r, dy in rows if dy < TILE_SIZE
+        ]
+
+    def busy_tiles(self, phases):
+        """
+        Tiles where the player may die, start riding or reach a goal in the
+        ticks with phases. On all other tiles nothing happens.
+        """
+        key = (phases[0], len(phases))
+
+        if key not in self.busy_tiles_cache:
+            self.busy_tiles_cache[key] = self.deadly_tiles.union(
+                self.goal_tiles,
+                *[self.object_tiles[p] for p in phases],
+                *[self.ride_tiles[p].keys() for p in phases],
+            )
+
+        return self.busy_tiles_cache[key]
+
+    def run(self, state, phases, left=None):
+        """
+        Run the game through the ticks with phases without pressing keys.
+        States below the number of tiles are tiles the player stands on,
+        the rest are objects the player rides on. left is the object the
+        player just jumped off. The collision handler only runs when a
+        contact begins, so the player does not start riding it again.
+
+        Returns (state, None) when the player is still alive, (None, goal) when
+        a goal is reached and (None, None) when the player dies.
+        """
+        tile_count = self.map_width * self.map_height
+
+        for phase in phases:
+            if state < tile_count:
+                if state in self.object_tiles[phase]:
+                    return None, None
+
+                ridable = next(
+                    (i for i in self.ride_tiles[phase].get(state, ()) if i != left),
+                    None,
+                )
+                if ridable is not None:
+                    state = tile_count + ridable
+                elif state in self.deadly_tiles:
+                    return None, None
+                elif state in self.goal_tiles:
+                    return None, state
+            elif state - tile_count in self.ride_ends[phase]:
+                return None, self.ride_ends[phase][state - tile_count]
+
+        return state, None
+
+    def press_key(self, state, tick, move):
+        """
+        (tile, object jumped off) after pressing a key. Tile is None if the player leaves the map.
+        """
+        tile_count = self.map_width * self.map_height
+
+        if state < tile_count:
+            x, y = self.tile_center(state)
+            left = None
+        else:
+            left = state - tile_count
+            x, y = self.positions[self.phase(tick)][left]
+
+        return self.tile_at(x + move[0] * TILE_SIZE, y + move[1] * TILE_SIZE), left
+
+    def solve_from(self, start, start_tick=0):
+        """
+        Ticks to reach each goal from a start tile, with the objects as they are
+        at start_tick. Breadth first search in time, so the first time a goal is
+        reached is the fastest.
+        """
+        tile_count = self.map_width * self.map_height
+        end_tick = start_tick + self.max_ticks
+
+        goal_ticks = {}
+
+        # States already reached in the same phase
+        seen = {(start, self.phase(start_tick))}
+        states = {start}
+        tick = start_tick
+
+        while states and tick < end_tick and len(goal_ticks) < len(self.goal_tiles):
+            next_tick = min(tick + self.input_ticks, end_tick)
+            phases = [self.phase(t) for t in range(tick + 1, next_tick + 1)]
+            next_phase = phases[-1]
+
+            # Pressing no key keeps the state
+            tiles = {state for state in states if state < tile_count}
+            tile_candidates = tiles.union(*[self.neighbours[state] for state in tiles])
+
+            # Nothing happens on quiet tiles, so only the other tiles are run tick by tick
+            quiet_tiles = tile_candidates - self.busy_tiles(phases)
+            candidates = [(state, None) for state in tile_candidates - quiet_tiles]
+
+            for state in states:
+                if state >= tile_count:
+                    candidates.append((state, None))
+                    candidates.extend(self.press_key(state, tick, move) for move in MOVES)
+
+            next_states = {state for state in quiet_tiles if (state, next_phase) not in seen}
+
+            for state, left in candidates:
+                if state is None:
+                    continue
+
+                state, goal = self.run(state, phases, left)
+
+                if goal is not None:
+                    goal_ticks.setdefault(goal, next_tick - start_tick)
+                elif state is not None and (state, next_phase) not in seen:
+                    next_states.add(state)
+
+            seen.update((state, next_phase) for state in next_states)
+
+            states = next_states
+            tick = next_tick
+
+        return goal_ticks
+
+    def solve(self):
+        """
+        Solve the level from all start positions. The player starts on a random
+        start position, so the slowest start position decides the clear time.
+        With all_phases, the slowest phase of the moving objects also does.
+        """
+        if not self.all_phases:
+            start_ticks = [0]
+        elif self.cycle_start is not None:
+            start_ticks = range(self.cycle_start + self.cycle_length)
+        else:
+            start_ticks = range(self.max_ticks + 1)
+
+        clear_ticks = dict.fromkeys(self.goal_tiles, 0 if self.start_tiles else None)
+
+        for start in self.start_tiles:
+            for start_tick in start_ticks:
+                goal_ticks = self.solve_from(start, start_tick)
+
+                for goal in self.goal_tiles:
+                    if clear_ticks[goal] is not None and goal in goal_ticks:
+                        clear_ticks[goal] = max(clear_ticks[goal], goal_ticks[goal])
+                    else:
+                        clear_ticks[goal] = None
+
+                # The level is not solvable, slower phases do not change that
+                if all(t is None for t in clear_ticks.values()):
+                    break
+
+        return LevelReport(
+            self.file_name,
+            {
+                (goal % self.map_width, goal // self.map_width):
+                    t / TICKS_PER_SECOND if t is not None else None
+                for goal, t in clear_ticks.items()
+            },
+        )
+
+
+def main():
+    """
+    Check the maps given on the command line. Exits with status 1 if any map is not solvable.
+    """
+    parser = argparse.ArgumentParser(description="Check that levels can be cleared in time")
+    parser.add_argument("maps", nargs="*", default=[MAP_FILE], help="TMX files to check")
+    parser.add_argument(
+        "--input-ticks",
+        type=int,
+        default=INPUT_TICKS,
+        help="physics ticks between key presses",
+    )
+    parser.add_argument(
+        "--all-phases",
+        action="store_true",
+        help="start from every phase of the moving objects, not just the level start (slow)",
+    )
+    args = parser.parse_args()
+
+    all_solvable = True
+
+    for file_name in args.maps:
+        report = LevelSolver(
+            file_name,
+            input_ticks=args.input_ticks,
+            all_phases=args.all_phases,
+        ).solve()
+        print(report)
+        all_solvable = all_solvable and report.solvable
+
+    sys.exit(0 if all_solvable else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Structured event logging that does not block the game.
+
+Events are put in a ring buffer and written to a JSON lines file by a
+background thread, so event handlers and physics callbacks never wait for
+file or console I/O.
+"""
+import json
+import threading
+import time
+
+
+# Verbosity levels. Events are logged when their level is at or below the telemetry level.
+OFF = 0
+INFO = 1
+DEBUG = 2
+
+LEVELS = {
+    "off": OFF,
+    "info": INFO,
+    "debug": DEBUG,
+}
+
+
+def ignore(event, **fields):
+    """
+    Used instead of logging methods for levels that are turned off
+    """
+
+
+class Telemetry:
+    """
+    Logs events to a JSON lines file
+    """
+
+    def __init__(self, file_name="telemetry.jsonl", level=INFO, size=4096, flush_interval=0.5):
+        """
+        Create a Telemetry channel. The ring buffer holds size events. If the
+        background thread falls behind, the oldest events are dropped and the
+        number of dropped events is logged.
+        """
+        self.file_name = file_name
+        self.level = level
+        self.size = size
+        self.flush_interval = flush_interval
+
+        # Ring buffer with (time, level, event, fields) tuples
+        self.buffer = [None] * size
+
+        # Number of events ever put in and taken out of the buffer
+        self.write_count = 0
+        self.read_count = 0
+
+        self.dropped = 0
+
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+        # Levels that are turned off cost only a call to a function doing nothing
+        if level < INFO:
+            self.info = ignore
+        if level < DEBUG:
+            self.debug = ignore
+
+        self.thread = None
+        if level > OFF:
+            self.thread = threading.Thread(target=self.run, name="telemetry", daemon=True)
+            self.thread.start()
+
+    def log(self, level, event, **fields):
+        """
+        Log an event. Does nothing if the level is above the telemetry level.
+        """
+        if level > self.level:
+            return
+
+        with self.lock:
+            if self.write_count - self.read_count == self.size:
+                # Buffer is full, overwrite the oldest event
+                self.read_count += 1
+                self.dropped += 1
+
+            self.buffer[self.write_count % self.size] = (time.time(), level, event, fields)
+            self.write_count += 1
+
+    def info(self, event, **fields):
+        self.log(INFO, event, **fields)
+
+    def debug(self, event, **fields):
+        self.log(DEBUG, event, **fields)
+
+    def flush(self):
+        """
+        Write the events in the buffer to the file
+        """
+        with self.lock:
+            events = []
+
+            # Clear the slots read, so the buffer does not keep old events alive
+            for i in range(self.read_count, self.write_count):
+                events.append(self.buffer[i % self.size])
+                self.buffer[i % self.size] = None
+
+            self.read_count = self.write_count
+
+            dropped = self.dropped
+            self.dropped = 0
+
+        if not events and not dropped:
+            return
+
+        lines = []
+
+        if dropped:
+            lines.append(json.dumps({"time": time.time(), "event": "dropped", "count": dropped}))
+
+        for event_time, _level, event, fields in events:
+            lines.append(json.dumps({"time": event_time, "event": event, **fields}, default=str))
+
+        with open(self.file_name, "a") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def run(self):
+        """
+        Flush the buffer until closed. Runs in the background thread.
+        """
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+        self.flush()
+
+    def close(self):
+        """
+        Stop the background thread and write the remaining events
+        """
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,235 @@
+"""
+Read Tiled maps (TMX) without loading any textures.
+
+arcade.tilemap.TileMap creates sprites and textures for everything in the map.
+This module only reads the tile ids, objects and tileset information, which is
+all that is needed to check or compare maps.
+"""
+import os
+import xml.etree.ElementTree as ElementTree
+
+
+# Tiled stores flipping of a tile in the highest bits of the gid
+FLIPPED_HORIZONTALLY_FLAG = 0x80000000
+FLIPPED_VERTICALLY_FLAG = 0x40000000
+FLIPPED_DIAGONALLY_FLAG = 0x20000000
+GID_MASK = 0x1FFFFFFF
+
+
+class MapError(ValueError):
+    """
+    A map file that cannot be read or is not valid
+    """
+
+
+def read_properties(element):
+    """
+    Read the custom properties of a map element into a dict
+    """
+    properties = {}
+
+    for p in element.iterfind("properties/property"):
+        value = p.get("value", p.text)
+        property_type = p.get("type", "string")
+
+        if property_type == "bool":
+            value = value == "true"
+        elif property_type == "int":
+            value = int(value)
+        elif property_type == "float":
+            value = float(value)
+
+        properties[p.get("name")] = value
+
+    return properties
+
+
+class TiledTileset:
+    """
+    A tileset used by a map. Can be embedded in the map or in a TSX file.
+    """
+
+    def __init__(self, element, first_gid, file_name=None, image_base=None):
+        self.first_gid = first_gid
+
+        # The TSX file the tileset was read from. None if embedded in the map.
+        self.file_name = file_name
+
+        self.tile_width = int(element.get("tilewidth"))
+        self.tile_height = int(element.get("tileheight"))
+        self.spacing = int(element.get("spacing", 0))
+        self.margin = int(element.get("margin", 0))
+        self.columns = int(element.get("columns"))
+        self.tile_count = int(element.get("tilecount"))
+
+        if self.columns < 1:
+            raise MapError(f"Tileset in {image_base} has no columns")
+
+        # The whole tileset, so that changes to tile properties, hit boxes or
+        # animations are seen when comparing tilesets
+        self.content = ElementTree.tostring(element)
+
+        # Image paths are relative to the file with the tileset (image_base). The absolute path is
+        # used, like arcade does, so textures are found in arcade's texture cache.
+        image = element.find("image")
+        if image is None:
+            raise MapError(f"Tileset in {image_base} has no image")
+
+        self.image = os.path.abspath(os.path.join(
+            os.path.dirname(image_base or ""),
+            image.get("source"),
+        ))
+
+    def tile_rect(self, gid):
+        """
+        The (x, y, width, height) of the tile in the tileset image
+        """
+        tile_id = (gid & GID_MASK) - self.first_gid
+
+        return (
+            self.margin + (tile_id % self.columns) * (self.tile_width + self.spacing),
+            self.margin + (tile_id // self.columns) * (self.tile_height + self.spacing),
+            self.tile_width,
+            self.tile_height,
+        )
+
+
+class TiledObject:
+    """
+    An object in an object layer
+    """
+
+    def __init__(self, element):
+        self.id = int(element.get("id"))
+        self.gid = int(element.get("gid", 0))
+        self.x = float(element.get("x", 0))
+        self.y = float(element.get("y", 0))
+        self.width = float(element.get("width", 0))
+        self.height = float(element.get("height", 0))
+        self.properties = read_properties(element)
+
+    def center(self, tmx_map, scaling):
+        """
+        Center of the object in screen coordinates, as placed by arcade.
+        Tile objects have their origin in the bottom left corner in Tiled.
+        """
+        return (
+            (self.x + self.width / 2) * scaling,
+            (tmx_map.height * tmx_map.tile_height - self.y + self.height / 2) * scaling,
+        )
+
+
+class TiledMap:
+    """
+    The tile ids and objects in a TMX file
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+
+        # Report all problems with the files as MapError, so callers only handle one error
+        try:
+            self.read(file_name)
+        except MapError:
+            raise
+        except (ElementTree.ParseError, OSError, AttributeError, TypeError, ValueError) as e:
+            raise MapError(f"Cannot read {file_name}: {e}") from e
+
+        self.check_gids()
+
+    def read(self, file_name):
+        """
+        Read the map from the TMX file, and the TSX files it uses
+        """
+        root = ElementTree.parse(file_name).getroot()
+
+        # Map size in tiles
+        self.width = int(root.get("width"))
+        self.height = int(root.get("height"))
+
+        # Tile size in pixels
+        self.tile_width = int(root.get("tilewidth"))
+        self.tile_height = int(root.get("tileheight"))
+
+        self.tilesets = []
+        for t in root.iterfind("tileset"):
+            source = t.get("source")
+            if source:
+                tsx_file = os.path.join(os.path.dirname(file_name), source)
+                element = ElementTree.parse(tsx_file).getroot()
+                image_base = tsx_file
+            else:
+                tsx_file = None
+                element = t
+                image_base = file_name
+
+            self.tilesets.append(
+                TiledTileset(element, int(t.get("firstgid")), tsx_file, image_base)
+            )
+
+        # Tile layers as lists of rows of gids. Row 0 is the top of the map.
+        self.layers = {}
+        for layer in root.iterfind("layer"):
+            data = layer.find("data")
+            if data is None or data.get("encoding") != "csv":
+                raise MapError(
+                    f"Layer '{layer.get('name')}' in {file_name} is not CSV encoded"
+                )
+
+            gids = [int(gid) for gid in (data.text or "").split(",") if gid.strip()]
+            if len(gids) != self.width * self.height:
+                raise MapError(
+                    f"Layer '{layer.get('name')}' in {file_name} has {len(gids)} tiles, "
+                    f"not {self.width * self.height}"
+                )
+
+            self.layers[layer.get("name")] = [
+                gids[row * self.width:(row + 1) * self.width]
+                for row in range(self.height)
+            ]
+
+        # Object layers as lists of objects
+        self.object_layers = {}
+        for group in root.iterfind("objectgroup"):
+            self.object_layers[group.get("name")] = [
+                TiledObject(o) for o in group.iterfind("object")
+            ]
+
+    def check_gids(self):
+        """
+        Raise MapError if a tile or object uses a gid that is not in a tileset
+        """
+        gids = {gid for rows in self.layers.values() for gids in rows for gid in gids}
+        gids.update(o.gid for objects in self.object_layers.values() for o in objects)
+
+        for gid in gids:
+            if not gid & GID_MASK:
+                continue
+
+            tileset = self.tileset_for(gid)
+            if tileset is None or (gid & GID_MASK) - tileset.first_gid >= tileset.tile_count:
+                raise MapError(f"Tile {gid & GID_MASK} in {self.file_name} is not in a tileset")
+
+    def tileset_for(self, gid):
+        """
+        The tileset holding the tile with the gid
+        """
+        gid &= GID_MASK
+
+        for tileset in reversed(self.tilesets):
+            if gid >= tileset.first_gid:
+                return tileset
+
+        return None
+
+    def tile_positions(self, layer_name):
+        """
+        (column, row) of the non-empty tiles in a layer.
+        Row 0 is the bottom of the map, like in screen coordinates.
+        """
+        return [
+            (column, self.height - 1 - row)
+            for row, gids in enumerate(self.layers.get(layer_name, []))
+            for column, gid in enumerate(gids)
+            if gid
+        ]
@@ -0,0 +1,219 @@
+"""
+Tests for hot reloading the map. Run with: python -m pytest
+"""
+import os
+import shutil
+from unittest.mock import ANY
+
+import arcade
+import pytest
+
+from my_constants import SPRITE_SCALING
+from my_game import GameView, load_tilemap_textures
+from my_reload import MapReloader
+from my_tmx import MapError
+
+
+MAP_DIR = os.path.join(os.path.dirname(__file__), "images", "tiny-battle")
+
+GOAL_ROW = "0,40,0,0,40,0,0,40,0,0,40,0,0,40,0,"
+
+
+class StubView:
+    """
+    The parts of GameView that MapReloader uses, without a window
+    """
+
+    add_goals = GameView.add_goals
+    add_goal = GameView.add_goal
+    add_moving_object = GameView.add_moving_object
+
+    def __init__(self, file_name):
+        self.pe = arcade.PymunkPhysicsEngine()
+        self.map = arcade.tilemap.TileMap(file_name, scaling=SPRITE_SCALING)
+        self.load_tilemap_textures = load_tilemap_textures(os.path.join(MAP_DIR, "tilemap.png"))
+
+        self.player = arcade.Sprite()
+        self.player.rides_on = None
+
+        self.goal_sprite_list = arcade.SpriteList(use_spatial_hash=False)
+        self.add_goals()
+
+        for object in self.map.sprite_lists["moving-objects"]:
+            self.add_moving_object(object)
+
+
+@pytest.fixture
+def map_file(tmp_path):
+    for name in ["sampleMap.tmx", "sampleSheet.tsx", "tilemap.png"]:
+        shutil.copy(os.path.join(MAP_DIR, name), tmp_path)
+
+    return os.path.join(tmp_path, "sampleMap.tmx")
+
+
+def read_file(file_name):
+    with open(file_name) as f:
+        return f.read()
+
+
+def write_file(file_name, text):
+    """
+    Write text to a file, and make sure its modification time changes
+    """
+    with open(file_name, "w") as f:
+        f.write(text)
+
+    mtime = os.stat(file_name).st_mtime_ns
+    os.utime(file_name, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+
+
+def edit_file(file_name, old, new):
+    """
+    Replace old with new in a file
+    """
+    text = read_file(file_name)
+
+    assert old in text
+    write_file(file_name, text.replace(old, new, 1))
+
+
+def sprite_counts(view):
+    return (
+        {name: len(sprite_list) for name, sprite_list in view.map.sprite_lists.items()},
+        len(view.goal_sprite_list),
+        len(view.pe.sprites),
+    )
+
+
+def test_nothing_changed(map_file):
+    view = StubView(map_file)
+    reloader = MapReloader(view, map_file, SPRITE_SCALING)
+
+    assert reloader.reload_if_changed() is None
+
+
+def test_changed_tile(map_file):
+    view = StubView(map_file)
+    reloader = MapReloader(view, map_file, SPRITE_SCALING)
+    layers, goals, bodies = sprite_counts(view)
+
+    # Goal row is the third from the top. Put a goal in the top left corner.
+    edit_file(map_file, GOAL_ROW, GOAL_ROW.replace("0,", "40,", 1))
+    changes = reloader.reload_if_changed()
+
+    assert changes["tiles"] == 1
+    assert len(view.map.sprite_lists["goal"]) == layers["goal"] + 1
+    assert len(view.goal_sprite_list) == goals + 1
+    assert len(view.pe.sprites) == bodies + 1
+    assert all(goal in view.pe.sprites for goal in view.goal_sprite_list)
+
+
+def test_removed_goal(map_file):
+    view = StubView(map_file)
+    reloader = MapReloader(view, map_file, SPRITE_SCALING)
+    layers, goals, bodies = sprite_counts(view)
+
+    edit_file(map_file, GOAL_ROW, GOAL_ROW.replace("40,", "0,", 1))
+    changes = reloader.reload_if_changed()
+
+    assert changes["tiles"] == 1
+    assert len(view.map.sprite_lists["goal"]) == layers["goal"] - 1
+    assert len(view.goal_sprite_list) == goals - 1
+    assert len(view.pe.sprites) == bodies - 1
+    assert (1, 15) not in [reloader.tile_at(g.position) for g in view.goal_sprite_list]
+
+
+def test_changed_moving_object(map_file):
+    view = StubView(map_file)
+    reloader = MapReloader(view, map_file, SPRITE_SCALING)
+    old_sprite = reloader.objects[3]
+    layers, goals, bodies = sprite_counts(view)
+
+    edit_file(
+        map_file,
+        '<property name="x-speed" type="int" value="50"/>',
+        '<property name="x-speed" type="int" value="80"/>',
+    )
+    changes = reloader.reload_if_changed()
+
+    new_sprite = reloader.objects[3]
+
+    assert changes == {"tiles": 0, "objects": 1, "ms": changes["ms"]}
+    assert sprite_counts(view) == (layers, goals, bodies)
+    assert old_sprite not in view.pe.sprites
+    assert new_sprite in view.pe.sprites
+    assert new_sprite.properties["x-speed"] == 80
+    assert view.pe.get_physics_object(new_sprite).body.velocity.x == 80
+
+
+def test_deleted_object_while_riding(map_file):
+    view = StubView(map_file)
+    reloader = MapReloader(view, map_file, SPRITE_SCALING)
+    layers, goals, bodies = sprite_counts(view)
+
+    object_id, ridden = next(
+        (i, s) for i, s in reloader.objects.items() if s.properties.get("ridable")
+    )
+    view.player.rides_on = ridden
+
+    text = read_file(map_file)
+    start = text.index(f'<object id="{object_id}"')
+    end = text.index("</object>", start) + len("</object>")
+    edit_file(map_file, text[start:end], "")
+
+    changes = reloader.reload_if_changed()
+
+    assert changes["objects"] == 1
+    assert view.player.rides_on is None
+    assert len(view.map.sprite_lists["moving-objects"]) == layers["moving-objects"] - 1
+    assert len(view.pe.sprites) == bodies - 1
+    assert ridden not in view.pe.sprites
+    assert object_id not in reloader.objects
+
+
+def test_broken_map_is_reported_once(map_file):
+    view = StubView(map_file)
+    reloader = MapReloader(view, map_file, SPRITE_SCALING)
+    counts = sprite_counts(view)
+    text = read_file(map_file)
+
+    edit_file(map_file, GOAL_ROW, "")
+
+    with pytest.raises(MapError):
+        reloader.reload_if_changed()
+
+    # The loaded map is kept, and the broken file is not read again
+    assert sprite_counts(view) == counts
+    assert reloader.reload_if_changed() is None
+
+    # Fixed on the next save
+    write_file(map_file, text)
+    assert reloader.reload_if_changed() == {"tiles": 0, "objects": 0, "ms": ANY}
+
+
+def test_changed_tileset_rebuilds_its_tiles(map_file):
+    view = StubView(map_file)
+    reloader = MapReloader(view, map_file, SPRITE_SCALING)
+    counts = sprite_counts(view)
+
+    # A change that does not touch the tileset image. Tile 39 is the goal tile (gid 40).
+    edit_file(
+        os.path.join(os.path.dirname(map_file), "sampleSheet.tsx"),
+        "</tileset>",
+        '<tile id="39"><properties><property name="points" type="int" value="10"/>'
+        "</properties></tile>\n</tileset>",
+    )
+    changes = reloader.reload_if_changed()
+
+    # All tiles use the one tileset
+    assert changes["tiles"] == sum(
+        1 for rows in reloader.tmx.layers.values() for gids in rows for gid in gids if gid
+    )
+    assert changes["objects"] == len(reloader.objects)
+    assert sprite_counts(view) == counts
+
+    # The sprites are the same as when the changed map is loaded at the start
+    new_map = arcade.tilemap.TileMap(map_file, scaling=SPRITE_SCALING)
+    for name, sprite_list in new_map.sprite_lists.items():
+        assert sorted(s.properties["tile_id"] for s in view.map.sprite_lists[name]) == \
+            sorted(s.properties["tile_id"] for s in sprite_list)
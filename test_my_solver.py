@@ -0,0 +1,61 @@
+"""
+Tests for the level solver. Run with: python -m pytest
+"""
+import os
+import shutil
+
+from my_solver import LevelSolver
+
+
+MAP_DIR = os.path.join(os.path.dirname(__file__), "images", "tiny-battle")
+
+
+def write_map(tmp_path, replacements):
+    """
+    Copy the sample map to tmp_path with text in the TMX file replaced.
+    Returns the name of the new TMX file.
+    """
+    with open(os.path.join(MAP_DIR, "sampleMap.tmx")) as f:
+        tmx = f.read()
+
+    for old, new in replacements:
+        assert old in tmx
+        tmx = tmx.replace(old, new, 1)
+
+    shutil.copy(os.path.join(MAP_DIR, "sampleSheet.tsx"), tmp_path)
+    shutil.copy(os.path.join(MAP_DIR, "tilemap.png"), tmp_path)
+
+    file_name = os.path.join(tmp_path, "map.tmx")
+    with open(file_name, "w") as f:
+        f.write(tmx)
+
+    return file_name
+
+
+def test_sample_map_is_solvable():
+    report = LevelSolver(os.path.join(MAP_DIR, "sampleMap.tmx")).solve()
+
+    assert report.solvable
+    assert report.clear_times[(7, 15)] == 1.7
+
+
+def test_unreachable_goal_without_object_cycle(tmp_path):
+    # A slow object does not repeat within LEVEL_TIME, and input ticks that do
+    # not divide LEVEL_TIME make the search end between key presses
+    file_name = write_map(tmp_path, [
+        ('<property name="x-speed" type="int" value="50"/>',
+         '<property name="x-speed" type="int" value="1"/>'),
+        # Goal in the top left corner of the water, out of reach
+        ("0,40,0,0,40,0,0,40,0,0,40,0,0,40,0,\n" + "0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,\n" * 2,
+         "0,40,0,0,40,0,0,40,0,0,40,0,0,40,0,\n" + "0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,\n" +
+         "5,0,0,0,0,0,0,0,0,0,0,0,0,0,0,\n"),
+    ])
+
+    solver = LevelSolver(file_name, input_ticks=7)
+    assert solver.cycle_start is None
+
+    report = solver.solve()
+
+    assert not report.solvable
+    assert report.clear_times[(0, 13)] is None
+    assert report.clear_times[(7, 15)] is not None
@@ -0,0 +1,66 @@
+"""
+Tests for the event logging. Run with: python -m pytest
+"""
+import json
+
+from my_telemetry import INFO, OFF, Telemetry
+
+
+def read_events(file_name):
+    with open(file_name) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_events_are_written_on_close(tmp_path):
+    file_name = tmp_path / "telemetry.jsonl"
+    telemetry = Telemetry(file_name, INFO, flush_interval=60)
+
+    telemetry.info("goal_collected", goals_left=4)
+    telemetry.debug("key_press", key=32)
+    telemetry.close()
+
+    events = read_events(file_name)
+
+    assert len(events) == 1
+    assert events[0]["event"] == "goal_collected"
+    assert events[0]["goals_left"] == 4
+
+
+def test_overflow_drops_oldest_events(tmp_path):
+    file_name = tmp_path / "telemetry.jsonl"
+
+    # The background thread does not flush before close()
+    telemetry = Telemetry(file_name, INFO, size=4, flush_interval=60)
+
+    for i in range(10):
+        telemetry.info("death", number=i)
+    telemetry.close()
+
+    events = read_events(file_name)
+
+    assert events[0]["event"] == "dropped"
+    assert events[0]["count"] == 6
+    assert [e["number"] for e in events[1:]] == [6, 7, 8, 9]
+
+
+def test_flush_clears_buffer(tmp_path):
+    telemetry = Telemetry(tmp_path / "telemetry.jsonl", INFO, size=4, flush_interval=60)
+
+    telemetry.info("death", cause="object")
+    telemetry.flush()
+
+    assert telemetry.buffer == [None] * 4
+
+    telemetry.close()
+
+
+def test_off_does_not_create_thread_or_file(tmp_path):
+    file_name = tmp_path / "telemetry.jsonl"
+    telemetry = Telemetry(file_name, OFF)
+
+    telemetry.info("level_start", goals=5)
+    telemetry.debug("key_press", key=32)
+    telemetry.close()
+
+    assert telemetry.thread is None
+    assert not file_name.exists()